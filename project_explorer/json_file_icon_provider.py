@@ -112,6 +112,9 @@ class JSONFileIconProvider(QFileIconProvider):
 
         self._file_default_icon = load_icon(settings['file_default'])
 
+        # Returned for anything without an icon, such as every directory.
+        self._empty_icon = load_icon(None)
+
     def icon(self, type_or_info):
         '''
         Returns the icon to use for the given file info or type.
@@ -134,7 +137,7 @@ class JSONFileIconProvider(QFileIconProvider):
 
                 return self._file_default_icon
 
-            return QIcon()
+            return self._empty_icon
         else:
             # called icon(type)
-            return self._type_icons.get(type_or_info, QIcon())
+            return self._type_icons.get(type_or_info, self._empty_icon)
@@ -6,7 +6,6 @@ A line edit for editing paths.
 '''
 
 import os
-import itertools
 
 from qtpy.QtCore import (
     Signal,
@@ -30,6 +29,7 @@ class PathEdit(QLineEdit):
         super(PathEdit, self).__init__(parent)
 
         self._tab_suggestions = None
+        self._tab_index = 0
         self._previous_text = None
         self._regex_filters = None
 
@@ -44,6 +44,15 @@ class PathEdit(QLineEdit):
         '''
         self._regex_filters = filters
 
+    def _directory_completions(self, text):
+        '''
+        Returns the completions of the given text that are directories.
+
+        The directory listings are cached by path_utils until the directories change, so this is
+        cheap to call again for the same text.
+        '''
+        return path_utils.complete_path(text, self._regex_filters, directories_only=True)
+
     def _tab_complete(self):
         '''
         Implements tab completion.
@@ -51,13 +60,10 @@ class PathEdit(QLineEdit):
         text = self.text()
 
         if self._tab_suggestions is None:
-            possibilities = path_utils.complete_path(text, self._regex_filters)
-
-            # Normalize the possibilities and filter to directories.
+            # Normalize the directory possibilities.
             possibilities = [
                 path_utils.normalize_path(path, _PATH_SEPARATOR)
-                for path in possibilities
-                if os.path.isdir(path)]
+                for path in self._directory_completions(text)]
 
             if len(possibilities) == 0:
                 return
@@ -69,19 +75,14 @@ class PathEdit(QLineEdit):
                 self.new_path.emit(path)
                 return
             else:
-                # Create a loop of suggestions.
-                self._tab_suggestions = itertools.cycle(possibilities)
+                self._tab_suggestions = possibilities
 
-                # Advance the suggestions by one if the current text is the first suggestion.
-                if text == possibilities[0]:
-                    next(self._tab_suggestions)
+                # Start from the second suggestion if the current text is the first suggestion.
+                self._tab_index = 1 if text == possibilities[0] else 0
 
         # Cycle through the possibilities.
-        try:
-            self.setText(next(self._tab_suggestions))
-        except StopIteration:
-            # There were no suggestions
-            pass
+        self.setText(self._tab_suggestions[self._tab_index % len(self._tab_suggestions)])
+        self._tab_index += 1
 
     def setText(self, text):
         '''
@@ -125,13 +126,7 @@ class PathEdit(QLineEdit):
             self.new_path.emit(path)
             return
 
-        possibilities = path_utils.complete_path(text, self._regex_filters)
-
-        # Normalize the possibilities and filter to directories.
-        possibilities = [
-            path_utils.normalize_path(path, _PATH_SEPARATOR)
-            for path in possibilities
-            if os.path.isdir(path)]
+        possibilities = self._directory_completions(text)
 
         if len(possibilities) == 0:
             # Do nothing if the path has no completions.
@@ -140,15 +135,18 @@ class PathEdit(QLineEdit):
             # Do nothing if there is more than one completion.
             return
 
-        possibility = possibilities[0]
+        # Only the single remaining possibility needs to be normalized.
+        possibility = path_utils.normalize_path(possibilities[0], _PATH_SEPARATOR)
         path = path_utils.normalize_path(text, _PATH_SEPARATOR)
 
         # Add a colon for drive letters.
         if len(path) == 1:
             path += ':'
 
-        # Go to the path if it is its own completion.
-        if path == possibility:
+        # Go to the path if it is its own completion. The names are compared in the same Unicode
+        # form, but the completion is what is used, as it is the name that is on disk.
+        if path_utils.comparison_key(path) == path_utils.comparison_key(possibility):
+            path = possibility
             if not path.endswith(_PATH_SEPARATOR):
                 path += _PATH_SEPARATOR
             self.setText(path)
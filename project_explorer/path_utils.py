@@ -6,8 +6,36 @@ Utilities for working with paths.
 '''
 
 import os
-
-def versioned_name(dirname, basename, at_end=False):
+import sys
+import time
+import bisect
+import functools
+import unicodedata
+from collections import OrderedDict
+
+# Directory listings cached by _scan_directory(), keyed on the directory path, from least to most
+# recently used.
+_directory_cache = OrderedDict()
+
+# The number of directory listings that _scan_directory() keeps.
+_DIRECTORY_CACHE_SIZE = 32
+
+# A listing is only trusted if it was taken at least this long after the directory was last
+# modified. Otherwise an entry added within the same timestamp tick as the listing would go unseen.
+# Two seconds covers the coarsest common timestamp resolution (FAT).
+_RACY_LISTING_NS = 2 * 10**9
+
+# The separators that normalize_path() can normalize to.
+_SEPARATORS = frozenset(('/', '\\'))
+
+try:
+    _is_ascii = str.isascii
+except AttributeError:
+    # str.isascii() needs Python 3.7. Only ASCII text has one UTF-8 byte per character.
+    def _is_ascii(text):
+        return len(text.encode('utf-8', 'surrogatepass')) == len(text)
+
+def versioned_name(dirname, basename, at_end=False, existing=None):
     '''
     Creates a versioned name for use in the given directory.
 
@@ -25,31 +53,54 @@ def versioned_name(dirname, basename, at_end=False):
             If true, the version will be added at the end of the name instead of before any
             extension. This is for use with names that are intended to be for directories.
 
+        - existing
+            A set of the names in the directory, as returned by directory_names(). If given, names
+            are checked against this set instead of the file system. Adding each returned name to
+            the set allows names to be picked for several items before any of them are created.
+
     Returns:
         The full path of the file name to use. Any version numbers will be added as an underscore
         followed by a number at the end of the path (immediately before the extension if there is
         one).
     '''
+    if existing is None:
+        exists = os.path.exists
+    else:
+        def exists(path):
+            return os.path.normcase(os.path.basename(path)) in existing
+
     generated_name = os.path.join(dirname, basename)
-    if not os.path.exists(generated_name):
+    if not exists(generated_name):
         return generated_name
 
-    # Get a free version suffix.
-    name, extension = os.path.splitext(basename)
+    # Get a free version suffix. The version goes before the extension unless at_end is given, in
+    # which case the whole name is kept in front of it.
+    if at_end:
+        name, extension = basename, ''
+    else:
+        name, extension = os.path.splitext(basename)
+
+    # Join once, so each candidate only needs a concatenation.
+    prefix = os.path.join(dirname, '')
+
     counter = 0
     while True:
-        if not at_end:
-            generated_name = os.path.join(dirname, '{}_{}{}'.format(name, counter, extension))
-        else:
-            generated_name = os.path.join(dirname, '{}_{}'.format(basename, counter))
+        generated_name = prefix + f'{name}_{counter}{extension}'
 
-        if not os.path.exists(generated_name):
+        if not exists(generated_name):
             break
 
         counter += 1
 
     return generated_name
 
+def directory_names(dirname):
+    '''
+    Returns a set of the names in the given directory, normalized with os.path.normcase, for use
+    with versioned_name().
+    '''
+    return {os.path.normcase(name) for _, name, _ in _scan_directory(dirname)}
+
 def isdir(path, ignore=None):
     '''
     Same as os.path.isdir, except returns false if the path is in the ignore set.
@@ -67,6 +118,46 @@ def isdir(path, ignore=None):
 
     return os.path.isdir(path)
 
+def _scan_directory(path):
+    '''
+    Lists the names in a directory using os.scandir().
+
+    Listings are cached until the modification time of the directory changes, so that repeated
+    calls for the same directory (for example one per keystroke while typing a path) cost a single
+    stat instead of a full directory read. Only the most recently used directories are kept.
+
+    Parameters:
+        path
+            The directory to list.
+
+    Returns:
+        A tuple of (key, name, is directory) tuples for the entries in the directory, where the key
+        is the lower cased comparison_key() of the name. These are sorted so that names sharing a
+        case and Unicode form insensitive prefix are adjacent.
+    '''
+    modified = os.stat(path).st_mtime_ns
+
+    cached = _directory_cache.get(path)
+    if cached is not None and cached[0] == modified:
+        _directory_cache.move_to_end(path)
+        return cached[1]
+
+    # time.time_ns() would need Python 3.7. Float precision is ample for the racy listing window.
+    scan_time = int(time.time() * 10**9)
+    with os.scandir(path) as entries:
+        # DirEntry.is_dir() usually comes from the directory read itself, without a stat.
+        names = tuple(sorted(
+            (comparison_key(entry.name).lower(), entry.name, entry.is_dir()) for entry in entries
+        ))
+
+    if scan_time - modified > _RACY_LISTING_NS:
+        _directory_cache[path] = (modified, names)
+        _directory_cache.move_to_end(path)
+        if len(_directory_cache) > _DIRECTORY_CACHE_SIZE:
+            _directory_cache.popitem(last=False)
+
+    return names
+
 def listdir(path, ignore=None):
     '''
     Same as os.listdir, except paths in the ignore set are filtered out.
@@ -79,7 +170,7 @@ def listdir(path, ignore=None):
             A regex_tools.FastListMatcher object of paths to ignore. These paths will be treated as
             if they don't exist.
     '''
-    paths = os.listdir(path)
+    paths = [name for _, name, _ in _scan_directory(path)]
 
     if ignore is not None:
         paths = [item for item in paths if not ignore.fullmatch(item)]
@@ -110,25 +201,31 @@ def valid_split(path, ignore=None):
     head = path
     basename = ''
 
+    # Bind the functions used in the loop, as it runs once per path component.
+    split = os.path.split
+    separator = os.sep
+
     while True:
-        head, basename = os.path.split(head)
+        head, basename = split(head)
 
         # Handle no valid head case.
         if head == '':
             break
 
         # Check if a valid head has been found.
-        if isdir(head + os.sep, ignore=ignore):
+        if isdir(head + separator, ignore=ignore):
             break
 
     return head, basename
 
+@functools.lru_cache(maxsize=4096)
 def normalize_path(path, separator='/'):
     '''
     Normalizes a path.
 
     Paths are normalized using os.path.normpath(), os.path.normcase(), and by replacing the path
-    separator.
+    separator. Results are cached, as the same paths are normalized on each keystroke while
+    editing a path, and interned so that comparing and hashing them is cheap.
 
     Parameters:
         - path
@@ -140,14 +237,34 @@ def normalize_path(path, separator='/'):
     Returns:
         The normalized path.
     '''
-    if separator == '/':
-        return os.path.normcase(os.path.normpath(path)).replace('\\', '/')
-    elif separator == '\\':
-        return os.path.normcase(os.path.normpath(path)).replace('/', '\\')
-    else:
+    if separator not in _SEPARATORS:
         raise Exception('Invalid path separator.')
 
-def complete_path(path, ignore=None):
+    normalized = os.path.normcase(os.path.normpath(path))
+
+    if separator == '/':
+        normalized = normalized.replace('\\', '/')
+    elif os.name != 'nt':
+        # On Windows os.path.normcase() already converts the separators to backslashes.
+        normalized = normalized.replace('/', '\\')
+
+    return sys.intern(normalized)
+
+def comparison_key(path):
+    '''
+    Returns the given path composed to Unicode NFC form, so that paths whose names are stored
+    decomposed (as macOS and some sync services do) compare equal to the same paths typed in.
+
+    This is only for comparing paths. Most file systems don't normalize names, so the result may not
+    name an existing item even when the given path does.
+    '''
+    # ASCII text is always in NFC form, and is by far the common case.
+    if _is_ascii(path):
+        return path
+
+    return unicodedata.normalize('NFC', path)
+
+def complete_path(path, ignore=None, directories_only=False):
     '''
     Completes the given path.
 
@@ -162,7 +279,8 @@ def complete_path(path, ignore=None):
 
     Otherwise, the path is split using valid_split() into a head and tail. Then a list of all paths
     in the head directory that are prefixed with the tail are returned as possible completions. This
-    prefix check is done case insensitively.
+    prefix check is done case insensitively, and composed and decomposed Unicode names match each
+    other. The completions use the names as they are on disk.
 
     Parameters:
         - path
@@ -172,6 +290,9 @@ def complete_path(path, ignore=None):
             A regex_tools.FastListMatcher object of paths to ignore. These paths will be treated as
             if they don't exist.
 
+        - directories_only
+            If true, only directories are returned as possible completions.
+
     Returns:
         A list containing paths (not ending in path separators).
     '''
@@ -198,11 +319,28 @@ def complete_path(path, ignore=None):
     if head == '':
         return []
 
-    # Filter to the ones that the current tail is a prefix to, and convert to full paths.
-    possibilities = [
-        os.path.join(head, name)
-        for name in listdir(head, ignore=ignore)
-        if name.lower().startswith(tail.lower())
-    ]
+    # Find the names that the current tail is a prefix to, and convert them to full paths. The
+    # listing is sorted by the same key as the tail, so the matches are the run of entries starting at the
+    # tail's insertion point.
+    tail = comparison_key(tail).lower()
+    try:
+        entries = _scan_directory(head)
+    except OSError:
+        # The head can't be listed, for example due to permissions.
+        return []
+    prefix = os.path.join(head, '')
+    possibilities = []
+    for index in range(bisect.bisect_left(entries, (tail,)), len(entries)):
+        key, name, is_dir = entries[index]
+        if not key.startswith(tail):
+            break
+
+        if directories_only and not is_dir:
+            continue
+
+        if ignore is not None and ignore.fullmatch(name):
+            continue
+
+        possibilities.append(prefix + name)
 
     return possibilities
@@ -178,8 +178,9 @@ class Project(QFrame):
 
         state = [root_paths, spliter_sizes]
 
+        # Encode in one shot and write once, rather than json.dump()'s chunk by chunk writes.
         with open(path, 'w') as save_file:
-            json.dump(state, save_file)
+            save_file.write(json.dumps(state))
 
         self._name = os.path.splitext(os.path.basename(path))[0]
 
@@ -312,8 +313,7 @@ class ProjectExplorer(QFrame):
         if not os.path.isdir(projects_directory):
             os.makedirs(projects_directory)
 
-        path, filter_ = QFileDialog.getOpenFileName(
-            self, 'Open Project', os.path.join(projects_directory))
+        path, filter_ = QFileDialog.getOpenFileName(self, 'Open Project', projects_directory)
 
         if path == '' and filter_ == '':
             return
@@ -7,6 +7,14 @@ This module contains tools for use with regular expressions.
 
 import re
 
+# Matches expressions that are a literal, optionally preceded and/or followed by ".*" or ".+". The
+# literal may not contain any special characters other than escaped punctuation.
+_SHAPE_REGEX = re.compile(
+    r'(\.[*+])?((?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*)(\.[*+])?', flags=re.DOTALL)
+
+# Matches the escapes in a literal expression.
+_ESCAPE_REGEX = re.compile(r'\\(.)', flags=re.DOTALL)
+
 class FastListMatcher:
     '''
     This class enables faster matching using a large list of regular expressions, where it is not a
@@ -16,6 +24,11 @@ class FastListMatcher:
     the length of the string being matched. This means that for a list of M expressions, the worst
     case is O(N * M). This can be avoided by compiling the expressions into a single expression,
     reducing the complexity.
+
+    For fullmatch(), expressions that are a literal with an optional leading and/or trailing ".*"
+    are further reduced to set membership, prefix, suffix, and substring tests. Only strings that
+    pass one of these tests are checked against the combined expression, and other strings only
+    need to be checked against the remaining expressions.
     '''
     def __init__(self, expressions, flags=0):
         '''
@@ -26,10 +39,58 @@ class FastListMatcher:
         ## flags
             Flags for re.compile.
         '''
+        expressions = list(expressions)
+
+        self._regex = self._compile(expressions, flags)
+
+        # Split out the literal based expressions for fullmatch(). Flags can change what a literal
+        # matches, so only do this without flags.
+        literals = set()
+        prefixes = []
+        suffixes = []
+        substrings = []
+        others = []
+        for expression in expressions:
+            shape = _SHAPE_REGEX.fullmatch(expression) if flags == 0 else None
+            if shape is None:
+                others.append(expression)
+                continue
+
+            leading, literal, trailing = shape.groups()
+            literal = _ESCAPE_REGEX.sub(r'\1', literal)
+
+            if leading and trailing:
+                substrings.append(literal)
+            elif leading:
+                suffixes.append(literal)
+            elif trailing:
+                prefixes.append(literal)
+            else:
+                literals.add(literal)
+
+        self._literals = frozenset(literals)
+        self._prefixes = tuple(prefixes)
+        self._suffixes = tuple(suffixes)
+
+        if substrings:
+            self._substring_regex = re.compile('|'.join(map(re.escape, substrings)))
+        else:
+            self._substring_regex = None
+
+        if others or not expressions:
+            self._fullmatch_regex = self._compile(others, flags)
+        else:
+            self._fullmatch_regex = None
+
+    @staticmethod
+    def _compile(expressions, flags):
+        '''
+        Compiles a list of expression strings into a single expression.
+        '''
         expressions = [f'(?:{expression})' for expression in expressions]
         expression = f'(?:{"|".join(expressions)})'
 
-        self._regex = re.compile(expression, flags=flags)
+        return re.compile(expression, flags=flags)
 
     def search(self, string):
         '''
@@ -47,4 +108,17 @@ class FastListMatcher:
         '''
         Check if the entire string is matches.
         '''
-        return self._regex.fullmatch(string)
+        # These tests match a superset of what their expressions do (for example ".*" does not match
+        # new lines), so let the combined expression decide and produce the match object.
+        if (
+                string in self._literals
+                or string.startswith(self._prefixes)
+                or string.endswith(self._suffixes)
+                or (self._substring_regex is not None and self._substring_regex.search(string))
+        ):
+            return self._regex.fullmatch(string)
+
+        if self._fullmatch_regex is None:
+            return None
+
+        return self._fullmatch_regex.fullmatch(string)
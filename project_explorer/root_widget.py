@@ -9,13 +9,16 @@ Tree based file system browser widget for browsing the file tree from a movable
 
 import os
 import re
+import stat
 import datetime
 import shutil
 import string
 import subprocess
+import functools
+import shlex
+import threading
 from pathlib import Path
-
-import ntfsutils.junction
+from concurrent.futures import ThreadPoolExecutor
 
 from qtpy.QtCore import (
     Signal,
@@ -25,6 +28,7 @@ from qtpy.QtCore import (
     QMimeData,
     QSortFilterProxyModel,
     QEvent,
+    QTimer,
 )
 
 from qtpy.QtWidgets import (
@@ -45,6 +49,140 @@ from . import regex_tools
 from .json_file_icon_provider import JSONFileIconProvider
 from .path_edit import PathEdit
 
+# Runs file operations, such as pastes and trashing, in the background. Threads are only started as
+# they are needed, and are then reused by later operations in every root.
+_file_operation_executor = ThreadPoolExecutor(8)
+
+# The names that pastes have picked for items that are still being copied, keyed by the normalized
+# destination directory. These are reserved until the copies finish, so that pasting again before
+# then doesn't pick the same names. The names are released from the file operation threads, so this
+# is only used with _pending_paste_names_lock held.
+_pending_paste_names = {}
+_pending_paste_names_lock = threading.Lock()
+
+# Starts context menu commands, so that process creation doesn't block the UI. A single thread keeps
+# commands starting in the order they were triggered.
+_command_executor = ThreadPoolExecutor(1)
+
+# The number of paths that FileSystemProxyModel remembers filtering results for.
+_FILTER_CACHE_SIZE = 65536
+
+# Junctions only exist on Windows.
+_CHECK_JUNCTIONS = os.name == 'nt'
+
+# Whether os.lstat() reports reparse tags (Windows with Python 3.8 or newer).
+_HAS_REPARSE_TAGS = _CHECK_JUNCTIONS and hasattr(stat, 'IO_REPARSE_TAG_MOUNT_POINT')
+
+# ntfsutils is only needed to detect junctions where os.lstat() can't.
+if _CHECK_JUNCTIONS and not _HAS_REPARSE_TAGS:
+    import ntfsutils.junction
+
+# Characters that the shell gives special meaning to. Commands that contain any of these are always
+# run through the shell. Programs with the script extensions can only be run by the shell.
+if os.name == 'nt':
+    _SHELL_CHARACTERS = frozenset('&|<>^%\n')
+    _SHELL_SCRIPT_EXTENSIONS = ('.bat', '.cmd')
+else:
+    _SHELL_CHARACTERS = frozenset('&|<>;()$`*?[]#~\n')
+    _SHELL_SCRIPT_EXTENSIONS = ()
+
+# On Windows subprocess starts the shell with its console window hidden, so console programs run
+# through it don't show a window. Programs started directly are given no console window to match.
+if os.name == 'nt':
+    # subprocess.CREATE_NO_WINDOW needs Python 3.7.
+    _DIRECT_CREATION_FLAGS = getattr(subprocess, 'CREATE_NO_WINDOW', 0x08000000)
+else:
+    _DIRECT_CREATION_FLAGS = 0
+
+def _run_command(command):
+    '''
+    Runs the given command string without waiting for it to finish.
+
+    Commands are run directly when possible, as starting a shell for each command is slow. Commands
+    that use shell syntax, or whose program the shell would not find as an executable (such as shell
+    built ins like "start", or batch files), are run through the shell.
+    '''
+    if _SHELL_CHARACTERS.isdisjoint(command):
+        try:
+            # On Windows the command line is parsed by the program itself, so it is passed as is,
+            # and only the program is split off.
+            if os.name == 'nt':
+                args = command
+                program = shlex.split(command, posix=False)[0].strip('"')
+            else:
+                args = shlex.split(command)
+                program = args[0]
+        except (ValueError, IndexError):
+            program = None
+
+        # Find the program the way the shell does. Left to itself, CreateProcess() on Windows looks
+        # in the application and system directories before PATH and ignores PATHEXT, so it could
+        # start a different program.
+        executable = None if program is None else shutil.which(program)
+
+        if (
+                executable is not None
+                and not executable.lower().endswith(_SHELL_SCRIPT_EXTENSIONS)
+        ):
+            try:
+                subprocess.Popen(
+                    args, executable=executable, creationflags=_DIRECT_CREATION_FLAGS)
+            except OSError:
+                pass
+            else:
+                return
+
+    subprocess.Popen(command, shell=True)
+
+@functools.lru_cache(maxsize=_FILTER_CACHE_SIZE)
+def _is_junction(path):
+    '''
+    Returns whether the given path is an NTFS junction. The results of this are cached and shared
+    between all roots.
+    '''
+    if not _HAS_REPARSE_TAGS:
+        return ntfsutils.junction.isjunction(path)
+
+    # Junctions are mount point reparse points. A single lstat() is cheaper than the reparse point
+    # query done by ntfsutils.
+    try:
+        return os.lstat(path).st_reparse_tag == stat.IO_REPARSE_TAG_MOUNT_POINT
+    except OSError:
+        return False
+
+def _release_paste_name(directory_key, name, future):
+    '''
+    Releases the name reserved for a pasted item once its copy has finished, as the name can then
+    be seen in the destination itself. This is called from the file operation threads.
+
+    This doesn't go through the root that started the paste, as the root may have been closed.
+    '''
+    with _pending_paste_names_lock:
+        pending = _pending_paste_names.get(directory_key)
+        if pending is None:
+            return
+
+        pending.discard(name)
+        if not pending:
+            del _pending_paste_names[directory_key]
+
+def _trash_paths(paths, trash_directory, date):
+    '''
+    Moves the given paths to the trash directory, adding the given date to their names.
+    '''
+    os.makedirs(trash_directory, exist_ok=True)
+
+    for path in paths:
+        item_name = os.path.basename(path)
+        deleted_item_name = '{}@{}'.format(item_name, date)
+
+        deleted_item_path = path_utils.versioned_name(
+            trash_directory, deleted_item_name, at_end=True)
+
+        # This is a rename unless the trash is on a different drive. The model picks up the move
+        # itself, so there is nothing to remove from it afterwards.
+        shutil.move(path, deleted_item_path)
+
 class ChDir:
     '''
     Context manager for changing the current working directory and restoring it.
@@ -60,6 +198,27 @@ class ChDir:
     def __exit__(self, exc_type, exc_val, exc_tb):
         os.chdir(self.previous_path)
 
+@functools.lru_cache(maxsize=None)
+def _shared_file_system_model():
+    '''
+    Returns the QFileSystemModel that is shared by all roots, creating it on first use.
+
+    Sharing the model means there is one set of file system watchers, one file info gatherer, and
+    one icon provider no matter how many roots are open. Each root views it through its own
+    FileSystemProxyModel.
+    '''
+    model = QFileSystemModel(QApplication.instance())
+    model.setRootPath('This PC')
+    model.setReadOnly(False)
+    model.setIconProvider(
+        JSONFileIconProvider('file_view_icons.json')
+    )
+    model.setFilter(
+        QDir.AllEntries | QDir.NoDotAndDotDot | QDir.AllDirs | QDir.Hidden
+    )
+
+    return model
+
 class FileSystemProxyModel(QSortFilterProxyModel):
     '''
     Sorts the source QFileSystemModel.
@@ -71,6 +230,47 @@ class FileSystemProxyModel(QSortFilterProxyModel):
 
         self._regex_filters = None
 
+        # Refilters once control returns to the event loop, so that several filter changes in a row
+        # only refilter the tree once.
+        self._invalidate_filter_timer = QTimer(self)
+        self._invalidate_filter_timer.setSingleShot(True)
+        self._invalidate_filter_timer.setInterval(0)
+        self._invalidate_filter_timer.timeout.connect(self.invalidateFilter)
+
+        # Qt asks about the same rows many times while sorting and expanding, so remember the
+        # result for each path.
+        self._accepts_path = functools.lru_cache(maxsize=_FILTER_CACHE_SIZE)(self._accepts_path)
+
+        # Sort keys by source index internal id, so that each item's key is built once rather than
+        # once per comparison.
+        self._sort_keys = {}
+
+        # Whether the current sort is descending, so that lessThan() doesn't ask for each
+        # comparison.
+        self._descending = False
+
+    def setSourceModel(self, model):
+        '''
+        Sets the QFileSystemModel to sort and filter.
+        '''
+        super(FileSystemProxyModel, self).setSourceModel(model)
+
+        # A path that is removed or renamed away may later be reused by a different kind of item,
+        # such as a junction, and the model may reuse the internal ids of removed items, so forget
+        # what is cached for them. Renamed items keep their internal id but change name. A reset
+        # invalidates every internal id.
+        model.rowsRemoved.connect(self._clear_caches)
+        model.fileRenamed.connect(self._clear_caches)
+        model.modelReset.connect(self._clear_caches)
+
+    def _clear_caches(self, *args):
+        '''
+        Clears the cached filtering results and sort keys.
+        '''
+        _is_junction.cache_clear()
+        self._accepts_path.cache_clear()
+        self._sort_keys.clear()
+
     def set_regex_filters(self, filters):
         '''
         Sets the model to filter out files.
@@ -80,20 +280,36 @@ class FileSystemProxyModel(QSortFilterProxyModel):
         '''
         self._regex_filters = filters
 
-        self.invalidateFilter()
+        self._accepts_path.cache_clear()
+        self._invalidate_filter_timer.start()
 
     def filterAcceptsRow(self, source_row, source_parent):
         '''
         Applies the filtering.
         '''
+        # Without regex filters, only junctions are hidden, so there is nothing to check for rows
+        # that can't be junctions.
+        if self._regex_filters is None and not _CHECK_JUNCTIONS:
+            return True
+
         model = self.sourceModel()
 
         # Get the row info.
         index = model.index(source_row, 0, source_parent)
-        path = model.filePath(index)
+        is_dir = model.isDir(index)
+
+        if self._regex_filters is None and not is_dir:
+            return True
 
-        # Filter out junctions as QFileSystemModel does not work well with them.
-        if ntfsutils.junction.isjunction(path):
+        return self._accepts_path(model.filePath(index), is_dir)
+
+    def _accepts_path(self, path, is_dir):
+        '''
+        Returns whether the given path should be shown. The results of this are cached.
+        '''
+        # Filter out junctions as QFileSystemModel does not work well with them. Only directories
+        # can be junctions, and the model already knows which items are directories.
+        if is_dir and _CHECK_JUNCTIONS and _is_junction(path):
             return False
 
         # Apply regex filtering.
@@ -132,28 +348,48 @@ class FileSystemProxyModel(QSortFilterProxyModel):
         '''
         return self.sourceModel().fileName(self.mapToSource(index))
 
+    def sort(self, column, order=Qt.AscendingOrder):
+        '''
+        Sorts the model.
+        '''
+        self._descending = order == Qt.DescendingOrder
+        super(FileSystemProxyModel, self).sort(column, order)
+
     def lessThan(self, left, right):
         '''
         Sorts directories before files, then sorts lexicographically.
         '''
-        model = self.sourceModel()
+        left_is_dir, left_name = self._sort_key(left)
+        right_is_dir, right_name = self._sort_key(right)
 
-        # Sort directories above files, regardless of sort order.
-        if model.isDir(left):
-            if not model.isDir(right):
-                return True if self.sortOrder() == Qt.AscendingOrder else False
-        elif model.isDir(right):
-            return False if self.sortOrder() == Qt.AscendingOrder else True
+        # Sort directories above files, then sort items of the same type lexicographically. Qt
+        # reverses the result for descending sorts, so flip the directory part of the comparison to
+        # keep directories above files regardless of sort order.
+        descending = self._descending
 
-        # Sort items of the same type (file or directory) lexicographically.
-        if model.filePath(left).lower() < model.filePath(right).lower():
-            return True
-        else:
-            return False
+        return (left_is_dir == descending, left_name) < (right_is_dir == descending, right_name)
+
+    def _sort_key(self, index):
+        '''
+        Returns (is directory, lower cased path) for the given source index. The results of this are
+        cached.
+        '''
+        internal_id = index.internalId()
+
+        key = self._sort_keys.get(internal_id)
+        if key is None:
+            model = self.sourceModel()
+            # fileName() is the display name, which for drives is the volume label, so the path is
+            # used to sort by the names themselves.
+            key = (model.isDir(index), model.filePath(index).lower())
+            self._sort_keys[internal_id] = key
+
+        return key
 
 class SubprocessAction(QAction):
     '''
-    An action that executes a command when triggered.
+    An action that executes a command when triggered. The parent of the action must be the
+    RootWidget that the command is for, which reports any failure to start the command.
     '''
     def __init__(self, *args, **kwargs):
         super(SubprocessAction, self).__init__(*args, **kwargs)
@@ -166,7 +402,92 @@ class SubprocessAction(QAction):
         '''
         Executes the actions command.
         '''
-        subprocess.Popen(self.command, shell=True)
+        self.parent().start_command(self.command)
+
+class _ContextMenuItem:
+    '''
+    A context menu item setting, preprocessed when the settings are applied so that this work isn't
+    repeated every time the context menu opens.
+    '''
+    def __init__(self, setting):
+        self.label = setting['label']
+        self.command = setting['command']
+        self.show_if_disabled = setting.get('show_if_disabled', False)
+
+        # Get the highest field number in the command string, as well as a set of field names.
+        field_names = set()
+        highest_field_number = None
+        for parse_record in string.Formatter().parse(self.command):
+            field_name = parse_record[1]
+            if field_name is None:
+                continue
+
+            field_names.add(field_name)
+
+            try:
+                field_number = int(field_name)
+            except ValueError:
+                pass
+            else:
+                if highest_field_number is None or field_number > highest_field_number:
+                    highest_field_number = field_number
+
+        self.field_names = frozenset(field_names)
+        self.highest_field_number = highest_field_number
+        self.uses_selected = 'selected' in field_names
+        self.uses_current_directory = 'current_directory' in field_names
+
+        # Whether all of the fields in the command are supported by format_command(). Only the part
+        # of each field before any indexing or attribute access names the argument. Unnamed fields
+        # are numbered automatically by str.format().
+        argument_names = {re.split(r'[.[]', field_name, 1)[0] for field_name in field_names}
+        self.formattable = all(
+            argument_name in ('', 'selected', 'current_directory') or argument_name.isdigit()
+            for argument_name in argument_names
+        )
+
+        # Bind the command's format method up front, or None if it can't be formatted.
+        self._format = self.command.format if self.formattable else None
+
+        self.require = None
+        if 'require' in setting:
+            self.require = regex_tools.FastListMatcher(setting['require'])
+
+        self.exclude = None
+        if 'exclude' in setting:
+            self.exclude = regex_tools.FastListMatcher(setting['exclude'])
+
+    def format_command(self, escaped_items, selected, current_directory):
+        '''
+        Returns the command with its fields filled in, or None if the command has fields that are
+        not supported.
+        '''
+        if self._format is None:
+            return None
+
+        return self._format(
+            *escaped_items,
+            selected=selected,
+            current_directory=current_directory)
+
+# The settings object that _context_menu_items() was last called with, and its result.
+_last_context_menu_items = (None, None)
+
+def _context_menu_items(settings):
+    '''
+    Returns the preprocessed context menu items for the given settings.
+
+    Every root is given the same settings object, so the items built for the last settings object
+    are reused rather than being rebuilt for each root.
+    '''
+    global _last_context_menu_items
+
+    last_settings, items = _last_context_menu_items
+    if settings is not last_settings:
+        items = [_ContextMenuItem(setting) for setting in settings.get('context_menu', [])]
+        _last_context_menu_items = (settings, items)
+
+    return items
 
 class RootWidget(QFrame):
     '''
@@ -175,22 +496,15 @@ class RootWidget(QFrame):
     close_request = Signal()
     open_request = Signal(str)
 
+    # Emitted from the background threads with an error message when an operation fails.
+    _operation_failed = Signal(str)
+
     def __init__(self, settings, path=None):
         super(RootWidget, self).__init__()
 
         # --- setup the file system model ---
-        model = QFileSystemModel()
-        model.setRootPath('This PC')
-        model.setReadOnly(False)
-        model.setIconProvider(
-            JSONFileIconProvider('file_view_icons.json')
-        )
-        model.setFilter(
-            QDir.AllEntries | QDir.NoDotAndDotDot | QDir.AllDirs | QDir.Hidden
-        )
-
         self._model = FileSystemProxyModel()
-        self._model.setSourceModel(model)
+        self._model.setSourceModel(_shared_file_system_model())
 
         # --- setup the tree view ---
         self._view = QTreeView()
@@ -202,6 +516,10 @@ class RootWidget(QFrame):
         self._view.setExpandsOnDoubleClick(False)
         self._view.sortByColumn(0, Qt.AscendingOrder)
 
+        # All rows are a single line with an icon, so let the view lay out rows without asking each
+        # one for its size.
+        self._view.setUniformRowHeights(True)
+
         # Setup drag and drop.
         self._view.setDragDropMode(QTreeView.DragDrop)
         self._view.setDefaultDropAction(Qt.MoveAction)
@@ -266,7 +584,14 @@ class RootWidget(QFrame):
             self._set_root_path(path)
             self._root_edit.update(path)
 
+        # Report background operation errors. The signal is emitted from other threads, so this is a
+        # queued connection.
+        self._operation_failed.connect(self._show_operation_error)
+
         self._settings = None
+        self._context_menu_items = None
+        self._open_with = None
+        self._open_with_regex = None
         self.update_settings(settings)
 
     def keyPressEvent(self, event):
@@ -293,40 +618,27 @@ class RootWidget(QFrame):
         '''
         Opens a context menu generated from the user settings.
         '''
-        menu_item_settings = self._settings['context_menu']
+        menu_items = self._context_menu_items
 
         # Don't do anything if there are no defined menu items.
-        if len(menu_item_settings) == 0:
+        if len(menu_items) == 0:
             return
 
         # Get all the selected file paths.
-        selected_items = [self._model.filePath(index) for index in self._view.selectedIndexes()]
+        selected_items = self._selected_paths()
 
         # Get the current directory the user is in.
         current_directory = self.current_directory()
 
-        # Create the menu.
-        menu = QMenu(self)
-        for menu_item_setting in menu_item_settings:
-            command = menu_item_setting['command']
-
-            # Get the highest field number in the command string, as well as a set of field names.
-            field_names = set()
-            highest_field_number = None
-            for parse_record in string.Formatter().parse(command):
-                field_name = parse_record[1]
-                if field_name is None:
-                    continue
+        # Quote the paths for use in commands.
+        escaped_items = ['"{}"'.format(item) for item in selected_items]
+        selected = ' '.join(escaped_items)
+        escaped_current_directory = '"{}"'.format(current_directory)
 
-                field_names.add(field_name)
-
-                try:
-                    field_number = int(field_name)
-                except ValueError:
-                    pass
-                else:
-                    if highest_field_number is None or field_number > highest_field_number:
-                        highest_field_number = field_number
+        # Create the menu actions. They are added to the menu together at the end.
+        actions = []
+        for menu_item in menu_items:
+            highest_field_number = menu_item.highest_field_number
 
             # If field numbers were used, then the menu item will be disabled if the number of
             # selected items does not equal the highest field number + 1.
@@ -335,68 +647,57 @@ class RootWidget(QFrame):
                 enabled = False
 
             # Disable the menu item if the command uses {selected}, but there is nothing selected.
-            if enabled and 'selected' in field_names and len(selected_items) == 0:
+            if enabled and menu_item.uses_selected and len(selected_items) == 0:
                 enabled = False
 
             # Disable the menu item if the command uses {current_directory}, but there is no
             # current directory.
-            if enabled and 'current_directory' in field_names and current_directory is None:
+            if enabled and menu_item.uses_current_directory and current_directory is None:
                 enabled = False
 
             # Disable the menu item if any of the selected items don't match at least one of the
-            # given regex patterns. Note that if this is specified at least one item must be
-            # selected.
-            if enabled and 'require' in menu_item_setting:
-                require_filters = regex_tools.FastListMatcher(menu_item_setting['require'])
-
-                if not selected_items:
-                    enabled = False
-                else:
-                    for path in selected_items:
-                        if not require_filters.fullmatch(path):
-                            enabled = False
-                            break
-
-            # Disable the menu item if any of the selected items matches any of the given regex
-            # patterns
-            if enabled and 'exclude' in menu_item_setting:
-                exclude_filters = regex_tools.FastListMatcher(menu_item_setting['exclude'])
-
+            # require regex patterns, or match any of the exclude regex patterns. Note that if
+            # require is specified at least one item must be selected. Both are checked in a single
+            # pass over the selected items.
+            require = menu_item.require
+            exclude = menu_item.exclude
+            if enabled and require is not None and not selected_items:
+                enabled = False
+            elif enabled and (require is not None or exclude is not None):
                 for path in selected_items:
-                    if exclude_filters.fullmatch(path):
+                    if require is not None and not require.fullmatch(path):
+                        enabled = False
+                        break
+
+                    if exclude is not None and exclude.fullmatch(path):
                         enabled = False
                         break
 
             if not enabled:
                 # Only create a menu item if it is not hidden.
-                if menu_item_setting.get('show_if_disabled', False):
-                    action = SubprocessAction(menu_item_setting['label'], self)
+                if menu_item.show_if_disabled:
+                    action = SubprocessAction(menu_item.label, self)
                     action.setEnabled(False)
-                    menu.addAction(action)
+                    actions.append(action)
 
                 # No need to setup the action command if it is disabled.
                 continue
 
-            action = SubprocessAction(menu_item_setting['label'], self)
-            menu.addAction(action)
+            action = SubprocessAction(menu_item.label, self)
+            actions.append(action)
 
             # Set the menu item command. The item will be disabled if there is a field in the
             # command string that is not supported.
-            escaped_items = ['"{}"'.format(item) for item in selected_items]
-            selected = ' '.join(escaped_items)
-            current_directory = '"{}"'.format(current_directory)
-            try:
-                command = menu_item_setting['command'].format(
-                    *escaped_items,
-                    selected=selected,
-                    current_directory=current_directory)
-            except KeyError:
+            command = menu_item.format_command(escaped_items, selected, escaped_current_directory)
+            if command is None:
                 action.setEnabled(False)
             else:
                 action.command = command
 
         # Show the menu if it has entries.
-        if len(menu.actions()) != 0:
+        if len(actions) != 0:
+            menu = QMenu(self)
+            menu.addActions(actions)
             menu.popup(self._view.mapToGlobal(point))
 
     def update_settings(self, new_settings):
@@ -414,13 +715,30 @@ class RootWidget(QFrame):
         self._root_edit.set_regex_filters(regex_filters)
         self._model.set_regex_filters(regex_filters)
 
+        self._context_menu_items = _context_menu_items(new_settings)
+
+        # Compile the open with patterns.
+        open_with = new_settings.get('open_with', [])
+        self._open_with = [(re.compile(pattern), command) for pattern, command in open_with]
+
+        # Also combine the patterns into a single regex, with a named group per pattern, so that
+        # one match finds the first pattern that matches. This is only safe if no pattern has its
+        # own groups, which would be renumbered, or inline flags, which would apply to all of them.
+        self._open_with_regex = None
+        if self._open_with and all(
+                pattern.groups == 0 and pattern.flags == re.UNICODE
+                for pattern, _ in self._open_with):
+            self._open_with_regex = re.compile('|'.join(
+                '(?P<_{}>{})'.format(number, pattern)
+                for number, (pattern, _) in enumerate(open_with)
+            ))
+
     def _copy(self):
         '''
         Copies all of the selected items to the clipboard.
         '''
         # Copy the urls of the selected files to the clipboard.
-        filePath = self._model.filePath
-        urls = [QUrl.fromLocalFile(filePath(index)) for index in self._view.selectedIndexes()]
+        urls = [QUrl.fromLocalFile(path) for path in self._selected_paths()]
 
         mime_data = QMimeData()
         mime_data.setUrls(urls)
@@ -442,18 +760,51 @@ class RootWidget(QFrame):
             # If the clipboard contains urls, copy from the sources.
             paths = [url.toLocalFile() for url in mime_data.urls() if url.isLocalFile()]
 
-            for path in paths:
-                source_directory = os.path.dirname(path)
+            # Pick all of the destinations up front from a single listing of the destination,
+            # adding each one so that items with the same name get different versions even though
+            # none of them exist yet. Names picked by earlier pastes that are still being copied are
+            # taken as well.
+            directory_key = os.path.normcase(os.path.abspath(destination_directory))
 
+            # Take the reserved names before listing the destination. A copy that finishes in
+            # between then releases its name only after its item exists, so the listing has it.
+            with _pending_paste_names_lock:
+                existing = set(_pending_paste_names.get(directory_key, ()))
+            existing |= path_utils.directory_names(destination_directory)
+
+            copies = []
+            for path in paths:
                 basename = os.path.basename(path)
 
-                if os.path.isdir(path):
+                # Stat once rather than separately checking for a directory and then a file.
+                try:
+                    mode = os.stat(path).st_mode
+                except OSError:
+                    continue
+
+                if stat.S_ISDIR(mode):
+                    copy = shutil.copytree
+                    destination = path_utils.versioned_name(
+                        destination_directory, basename, at_end=True, existing=existing)
+                elif stat.S_ISREG(mode):
+                    copy = shutil.copy2
                     destination = path_utils.versioned_name(
-                        destination_directory, basename, at_end=True)
-                    shutil.copytree(path, destination)
-                elif os.path.isfile(path):
-                    destination = path_utils.versioned_name(destination_directory, basename)
-                    shutil.copy2(path, destination)
+                        destination_directory, basename, existing=existing)
+                else:
+                    continue
+
+                name = os.path.normcase(os.path.basename(destination))
+                existing.add(name)
+                with _pending_paste_names_lock:
+                    _pending_paste_names.setdefault(directory_key, set()).add(name)
+                copies.append((copy, path, destination, name))
+
+            # The copies are I/O bound, so do them in parallel, and in the background so that large
+            # copies don't block the UI. The model picks up the new items as they are created.
+            for copy, source, destination, name in copies:
+                future = self._run_in_background('Unable to paste item.', copy, source, destination)
+                future.add_done_callback(
+                    functools.partial(_release_paste_name, directory_key, name))
         elif mime_data.hasText():
             # If the clipboard contains text, paste it to the root edit.
             self._root_edit.paste()
@@ -461,6 +812,56 @@ class RootWidget(QFrame):
         # elif mime_data.hasImage():
             # create image file with contents
 
+    def start_command(self, command):
+        '''
+        Starts the given command string in the background, showing an error if it can't be started.
+        '''
+        self._run_in_background(
+            'Unable to run command.', _run_command, command, executor=_command_executor)
+
+    def _run_in_background(self, error_message, function, *args, executor=_file_operation_executor):
+        '''
+        Calls the given function with the given arguments on the given executor, which defaults to
+        the file operation threads. If it raises, an error starting with the given message is shown.
+
+        Returns the future of the call.
+        '''
+        future = executor.submit(function, *args)
+        future.add_done_callback(functools.partial(self._handle_operation_done, error_message))
+
+        return future
+
+    def _handle_operation_done(self, error_message, future):
+        '''
+        Handles the completion of a background operation. This is called from the thread that ran
+        it.
+        '''
+        error = future.exception()
+        if error is not None:
+            self._operation_failed.emit('{}\n\n{}'.format(error_message, error))
+
+    def _show_operation_error(self, message):
+        '''
+        Shows an error for a failed background operation.
+        '''
+        QMessageBox.critical(self, 'Error', message)
+
+    def _selected_indexes(self):
+        '''
+        Returns the selected indexes, with one index per selected row.
+        '''
+        return [index for index in self._view.selectedIndexes() if index.column() == 0]
+
+    def _selected_paths(self):
+        '''
+        Returns the paths of the selected items.
+        '''
+        # Go straight to the source model rather than through the proxy's pass through.
+        source_model = self._model.sourceModel()
+        map_to_source = self._model.mapToSource
+
+        return [source_model.filePath(map_to_source(index)) for index in self._selected_indexes()]
+
     def current_item_directory(self):
         '''
         Returns the directory containing the currently selected item.
@@ -486,7 +887,8 @@ class RootWidget(QFrame):
 
         active_path = self._model.filePath(current_index)
 
-        if os.path.isdir(active_path):
+        # The model already knows whether the item is a directory, so there is no need to stat it.
+        if self._model.isDir(current_index):
             directory = active_path
         else:
             directory = os.path.dirname(active_path)
@@ -500,8 +902,9 @@ class RootWidget(QFrame):
         '''
         directory = self.current_directory()
 
-        # Get a free file name
-        new_file_path = path_utils.versioned_name(directory, 'new_file')
+        # Get a free file name, checking candidates against a single listing of the directory.
+        new_file_path = path_utils.versioned_name(
+            directory, 'new_file', existing=path_utils.directory_names(directory))
 
         # Create the new file.
         open(new_file_path, 'a').close()
@@ -518,8 +921,10 @@ class RootWidget(QFrame):
         '''
         directory = self.current_directory()
 
-        # Get a free directory name
-        new_directory_path = path_utils.versioned_name(directory, 'new_directory', at_end=True)
+        # Get a free directory name, checking candidates against a single listing of the directory.
+        new_directory_path = path_utils.versioned_name(
+            directory, 'new_directory', at_end=True,
+            existing=path_utils.directory_names(directory))
 
         # Create the new file.
         os.mkdir(new_directory_path)
@@ -533,7 +938,7 @@ class RootWidget(QFrame):
         '''
         Deletes all of the currently selected items.
         '''
-        selected_indexes = self._view.selectedIndexes()
+        selected_indexes = self._selected_indexes()
 
         if len(selected_indexes) == 0:
             return
@@ -547,31 +952,27 @@ class RootWidget(QFrame):
         if selection != QMessageBox.Yes:
             return
 
-        for index in selected_indexes:
+        # Remove from the bottom up so that removals don't shift the rows of indexes still to be
+        # removed.
+        for index in sorted(selected_indexes, key=lambda index: index.row(), reverse=True):
             self._model.remove(index)
 
     def _trash_selected(self):
         '''
         Moves all of the currently selected items to the trash directory.
         '''
-        trash_directory = self._settings['trash_directory']
-
-        if not os.path.isdir(trash_directory):
-            os.makedirs(trash_directory)
-
-        for index in self._view.selectedIndexes():
-            path = self._model.filePath(index)
+        # Resolve the trash directory now, as the working directory may change while the items are
+        # being moved.
+        trash_directory = os.path.abspath(self._settings['trash_directory'])
 
-            item_name = os.path.basename(path)
-            filesystem_frendly_date = str(datetime.datetime.now()).replace(':', ';')
-            deleted_item_name = '{}@{}'.format(item_name, filesystem_frendly_date)
+        # All of the items trashed together get the same date. Items with the same name still get
+        # unique names from versioned_name().
+        filesystem_frendly_date = datetime.datetime.now().strftime('%Y-%m-%d %H;%M;%S.%f')
 
-            deleted_item_path = path_utils.versioned_name(
-                trash_directory, deleted_item_name, at_end=True)
-
-            shutil.move(self._model.filePath(index), deleted_item_path)
-
-            self._model.remove(index)
+        # Moves to a trash on a different drive are copies, so do the moves in the background.
+        self._run_in_background(
+            'Unable to move items to the trash.',
+            _trash_paths, self._selected_paths(), trash_directory, filesystem_frendly_date)
 
     def _handle_activated_index(self, index):
         '''
@@ -599,11 +1000,10 @@ class RootWidget(QFrame):
         '''
         path = self._model.filePath(index)
 
-        for pattern, command in self._settings['open_with']:
-            if re.fullmatch(pattern, path):
-                expanded_command = command.format(path='"{}"'.format(path))
-                subprocess.Popen(expanded_command, shell=True)
-                break
+        command = self._open_with_command(path)
+        if command is not None:
+            expanded_command = command.format(path='"{}"'.format(path))
+            _run_command(expanded_command)
         else:
             # Open the file with the OS settings.
             try:
@@ -617,6 +1017,24 @@ class RootWidget(QFrame):
                     'Unable to open file. Check windows file association settings.'
                 )
 
+    def _open_with_command(self, path):
+        '''
+        Returns the command of the first open with setting that matches the given path, or None if
+        there is no match.
+        '''
+        if self._open_with_regex is not None:
+            match = self._open_with_regex.fullmatch(path)
+            if match is None:
+                return None
+
+            return self._open_with[int(match.lastgroup[1:])][1]
+
+        for pattern, command in self._open_with:
+            if pattern.fullmatch(path):
+                return command
+
+        return None
+
     def _set_root_path(self, path):
         '''
         Changes the root to view the given path.
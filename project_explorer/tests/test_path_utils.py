@@ -1,17 +1,23 @@
 
 import os
 import shutil
+import string
 import tempfile
 from unittest import TestCase
 
 import project_explorer.path_utils as path_utils
 
 class TestVersionedName(TestCase):
-    def setUp(self):
-        self.directory = tempfile.mkdtemp()
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
 
-    def tearDown(self):
-        shutil.rmtree(self.directory)
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=self.root)
 
     def test_versioning(self):
         '''
@@ -71,6 +77,24 @@ class TestVersionedName(TestCase):
         expected_output = os.path.join(self.directory, 'foo.txt_0')
         self.assertEqual(output, expected_output)
 
+    def test_existing(self):
+        '''
+        Test that names are checked against the given set of existing names instead of the file
+        system.
+        '''
+        with open(os.path.join(self.directory, 'foo.txt'), 'w'):
+            pass
+        existing = path_utils.directory_names(self.directory)
+
+        output = path_utils.versioned_name(self.directory, 'foo.txt', existing=existing)
+        expected_output = os.path.join(self.directory, 'foo_0.txt')
+        self.assertEqual(output, expected_output)
+
+        existing.add(os.path.normcase(os.path.basename(output)))
+        output = path_utils.versioned_name(self.directory, 'foo.txt', existing=existing)
+        expected_output = os.path.join(self.directory, 'foo_1.txt')
+        self.assertEqual(output, expected_output)
+
 class TestValidSplit(TestCase):
     def test_valid_file_path(self):
         '''
@@ -181,7 +205,73 @@ class TestNormalizePath(TestCase):
         with self.assertRaises(Exception):
             path_utils.normalize_path('c:/foo/goo', separator='X')
 
+class TestListdir(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_changes_seen(self):
+        '''
+        Tests that repeated listings of a directory reflect entries added and removed between them.
+        '''
+        self.assertEqual(path_utils.listdir(self.directory), [])
+
+        os.mkdir(os.path.join(self.directory, 'foo'))
+        self.assertEqual(path_utils.listdir(self.directory), ['foo'])
+
+        with open(os.path.join(self.directory, 'goo'), 'w'):
+            pass
+        self.assertEqual(set(path_utils.listdir(self.directory)), {'foo', 'goo'})
+
+        os.rmdir(os.path.join(self.directory, 'foo'))
+        self.assertEqual(path_utils.listdir(self.directory), ['goo'])
+
+    def test_cached_changes_seen(self):
+        '''
+        Tests that a cached listing of a directory is replaced once the directory changes.
+        '''
+        # Date the directory back after each change, so that each listing is old enough to be
+        # cached. Each date differs so that the change can be seen.
+        past = os.stat(self.directory).st_mtime - 60
+
+        os.utime(self.directory, (past, past))
+        self.assertEqual(path_utils.listdir(self.directory), [])
+        self.assertIn(self.directory, path_utils._directory_cache)
+
+        os.mkdir(os.path.join(self.directory, 'foo'))
+        os.utime(self.directory, (past + 1, past + 1))
+        self.assertEqual(path_utils.listdir(self.directory), ['foo'])
+
+        os.rmdir(os.path.join(self.directory, 'foo'))
+        os.utime(self.directory, (past + 2, past + 2))
+        self.assertEqual(path_utils.listdir(self.directory), [])
+
+    def test_cache_bounded(self):
+        '''
+        Tests that only a limited number of directory listings are kept.
+        '''
+        # Date the directories back so that their listings aren't too recent to be cached.
+        past = os.stat(self.directory).st_mtime - 60
+        for number in range(path_utils._DIRECTORY_CACHE_SIZE * 2):
+            directory = os.path.join(self.directory, str(number))
+            os.mkdir(directory)
+            os.utime(directory, (past, past))
+            path_utils.listdir(directory)
+
+        self.assertLessEqual(len(path_utils._directory_cache), path_utils._DIRECTORY_CACHE_SIZE)
+        self.assertIn(directory, path_utils._directory_cache)
+
 class TestCompletePath(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root)
+
     def test_drive_letters(self):
         '''
         Tests drive letter completions.
@@ -189,7 +279,7 @@ class TestCompletePath(TestCase):
         valid_drive_letter = 'C'
 
         invalid_drive_letter = None
-        for drive_letter in (chr(x) for x in xrange(65, 91)):
+        for drive_letter in string.ascii_uppercase:
             if not os.path.isdir(drive_letter + ':'):
                 invalid_drive_letter = drive_letter
                 break
@@ -233,7 +323,7 @@ class TestCompletePath(TestCase):
         expected_output = []
         self.assertEqual(output, expected_output)
 
-        test_directory = tempfile.mkdtemp()
+        test_directory = tempfile.mkdtemp(dir=self.root)
 
         # Test valid unambiguous path
         test_path = os.path.join(test_directory, 'unambiguous_dir')
@@ -281,4 +371,38 @@ class TestCompletePath(TestCase):
         expected_output = [ambiguous_test_path_1, ambiguous_test_path_2]
         self.assertEqual(set(output), set(expected_output))
 
-        shutil.rmtree(test_directory)
+    def test_directories_only(self):
+        '''
+        Test that files are left out of the completions if only directories are requested.
+        '''
+        test_directory = tempfile.mkdtemp(dir=self.root)
+
+        directory_path = os.path.join(test_directory, 'foo_dir')
+        os.mkdir(directory_path)
+        file_path = os.path.join(test_directory, 'foo_file')
+        with open(file_path, 'w'):
+            pass
+
+        test_path = os.path.join(test_directory, 'foo')
+        output = path_utils.complete_path(test_path)
+        expected_output = [directory_path, file_path]
+        self.assertEqual(set(output), set(expected_output))
+
+        output = path_utils.complete_path(test_path, directories_only=True)
+        expected_output = [directory_path]
+        self.assertEqual(output, expected_output)
+
+    def test_unicode(self):
+        '''
+        Test that a composed name completes to a directory whose name is stored decomposed, and that
+        the completion is the name as it is stored.
+        '''
+        test_directory = tempfile.mkdtemp(dir=self.root)
+
+        decomposed_path = os.path.join(test_directory, 'cafe\u0301')
+        os.mkdir(decomposed_path)
+
+        output = path_utils.complete_path(
+            os.path.join(test_directory, 'caf\u00e9'), directories_only=True)
+        expected_output = [decomposed_path]
+        self.assertEqual(output, expected_output)
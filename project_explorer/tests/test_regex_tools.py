@@ -0,0 +1,81 @@
+
+import re
+from unittest import TestCase
+
+from project_explorer.regex_tools import FastListMatcher
+
+_MATCH_TYPE = type(re.match('', ''))
+
+class TestFastListMatcher(TestCase):
+    expressions = (
+        'c:/foo',
+        r'c:/foo\.txt',
+        r'.*\.pyc',
+        '.*/__pycache__',
+        '.*/build/.*',
+        r'[a-z]:/goo',
+        'd:/moo/.+',
+        r'.+\.txt',
+    )
+
+    strings = (
+        '',
+        'c:/foo',
+        'c:/foo.txt',
+        'c:/fooXtxt',
+        'c:/foo/bar.pyc',
+        'c:/foo/bar.py',
+        'c:/foo/__pycache__',
+        'c:/foo/__pycache__/bar',
+        'c:/foo/build/bar',
+        'c:/foo/build',
+        'd:/goo',
+        'd:/moo/',
+        'd:/moo/bar',
+        'd:/moo/bar\n',
+        '.txt',
+        'c:/foo\nbar.pyc',
+    )
+
+    def assert_same_as_re(self, expressions, flags=0):
+        '''
+        Asserts that the matcher agrees with trying each expression individually.
+        '''
+        matcher = FastListMatcher(expressions, flags=flags)
+
+        for string in self.strings:
+            for method in ('fullmatch', 'match', 'search'):
+                expected_output = any(
+                    getattr(re, method)(expression, string, flags=flags)
+                    for expression in expressions
+                )
+                output = getattr(matcher, method)(string)
+
+                self.assertEqual(bool(output), expected_output, (method, string))
+
+                if output:
+                    self.assertIsInstance(output, _MATCH_TYPE)
+
+    def test_mixed(self):
+        '''
+        Tests a mix of literal and non literal expressions.
+        '''
+        self.assert_same_as_re(self.expressions)
+
+    def test_literals_only(self):
+        '''
+        Tests only literal expressions.
+        '''
+        self.assert_same_as_re(('c:/foo', r'c:/foo\.txt'))
+
+    def test_shapes_only(self):
+        '''
+        Tests only expressions that are literals with leading and/or trailing wildcards.
+        '''
+        self.assert_same_as_re((r'.*\.pyc', '.*/__pycache__', '.*/build/.*', 'd:/moo/.+'))
+
+    def test_flags(self):
+        '''
+        Tests that flags are still applied to literal expressions.
+        '''
+        self.assert_same_as_re(('C:/FOO', r'.*\.PYC'), flags=re.IGNORECASE)
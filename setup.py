@@ -9,9 +9,10 @@ setup(
     author='Mark Fisher',
     license='MIT',
     packages=['project_explorer'],
+    python_requires='>=3.6',
     install_requires=[
         'qtpy',
-        'ntfsutils',
+        'ntfsutils; platform_system == "Windows"',
         'pyScss'
     ],
     include_package_data=True,
@@ -23,8 +24,7 @@ setup(
         'Programming Language :: Python :: 3.6',
         'License :: OSI Approved :: MIT License',
     ],
-    test_suite='nose.collector',
-    tests_require=['nose'],
+    tests_require=['pytest', 'pytest-cov', 'pytest-xdist'],
     entry_points={
         'gui_scripts': [
             'project_explorer = project_explorer.__main__:main',